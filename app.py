@@ -1,12 +1,8 @@
 import streamlit as st
 import pandas as pd
 import time
-import uuid
-import json
-import hashlib
-from datetime import datetime, timedelta
-import base64
-from io import BytesIO
+from secrets import token_hex
+from datetime import datetime
 
 # Configure page
 st.set_page_config(
@@ -382,7 +378,7 @@ def simulate_app_generation():
 
 def generate_app_url():
     """Generate a unique URL for the created app"""
-    unique_id = str(uuid.uuid4())[:8]
+    unique_id = token_hex(4)
     timestamp = int(datetime.now().timestamp())
     
     # In a real implementation, you would:
@@ -413,7 +409,7 @@ def main():
         uploaded_file = st.file_uploader(
             "Choose your Excel or CSV file",
             type=['xlsx', 'xls', 'csv'],
-            help="Supported formats: .xlsx, .xls, .csv"
+            help="Supported formats: .xlsx, .xls, .csv (max 10MB)"
         )
         
         if uploaded_file is not None:
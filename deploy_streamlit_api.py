@@ -1,4 +1,6 @@
 import os
+import asyncio
+import hashlib
 import shutil
 import tempfile
 import zipfile
@@ -6,14 +8,17 @@ import subprocess
 import socket
 import uuid
 import logging
-from typing import Optional, Dict
+from collections import deque
+from typing import Optional, Dict, Tuple
 from fastapi import FastAPI, UploadFile, Form, HTTPException
 from fastapi.responses import JSONResponse
 import uvicorn
 from contextlib import asynccontextmanager
+import selectors
 import signal
 import atexit
 import threading
+import time
 
 # Configure logging
 logging.basicConfig(
@@ -25,9 +30,26 @@ logger = logging.getLogger(__name__)
 # Global state to track active deployments
 active_deployments: Dict[str, dict] = {}
 
+# Seconds between liveness sweeps over all deployed Streamlit processes
+MONITOR_INTERVAL = float(os.getenv("MONITOR_INTERVAL", "10"))
+# Upper bound on waiting for an exited process's remaining output / for it to be reaped
+OUTPUT_READ_TIMEOUT = 5
+# Recent output lines kept per deployment for the crash log
+OUTPUT_TAIL_LINES = 200
+# How long a new Streamlit process gets to start listening, and how many ports to try
+STARTUP_TIMEOUT = float(os.getenv("STARTUP_TIMEOUT", "30"))
+PORT_ATTEMPTS = 3
+READY_BANNER = b"You can now view"
+
 class DeploymentManager:
     def __init__(self):
         self.lock = threading.Lock()
+        # Digest of the requirements.txt most recently installed into this environment
+        self.installed_requirements = None
+        # One shared monitor thread watches every deployment instead of a timer per deployment
+        self.stop_event = threading.Event()
+        self.monitor_thread = threading.Thread(target=self.monitor_deployments, daemon=True)
+        self.monitor_thread.start()
     
     def find_free_port(self) -> int:
         """Find a free TCP port on localhost."""
@@ -41,6 +63,14 @@ class DeploymentManager:
         """Install Python dependencies from requirements.txt if it exists."""
         requirements_path = os.path.join(project_dir, 'requirements.txt')
         if os.path.exists(requirements_path):
+            with open(requirements_path, 'rb') as f:
+                digest = hashlib.sha256(f.read()).hexdigest()
+            # Every deployment installs into this one environment, so only a repeat of the last
+            # successful install is safe to skip - any install in between may have changed versions
+            with self.lock:
+                if digest == self.installed_requirements:
+                    logger.info(f"Dependencies from {requirements_path} already installed, skipping pip")
+                    return True
             try:
                 subprocess.run(
                     ['pip', 'install', '-r', requirements_path],
@@ -49,9 +79,14 @@ class DeploymentManager:
                     text=True
                 )
                 logger.info(f"Dependencies installed from {requirements_path}")
+                with self.lock:
+                    self.installed_requirements = digest
                 return True
             except subprocess.CalledProcessError as e:
                 logger.error(f"Failed to install dependencies: {e.stderr}")
+                # A failed run may still have changed the environment
+                with self.lock:
+                    self.installed_requirements = None
                 return False
         return True
     
@@ -86,33 +121,94 @@ class DeploymentManager:
                     '--browser.gatherUsageStats', 'false'
                 ],
                 cwd=project_dir,
+                # One unbuffered stream: the ready banner and any startup error arrive in order
                 stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                env={**os.environ, 'PYTHONUNBUFFERED': '1'},
             )
             
-            # Give it a moment to start
-            threading.Timer(2.0, self.check_streamlit_status, args=[proc, port, deployment_id]).start()
-            
             return proc
         except Exception as e:
             logger.error(f"Failed to start Streamlit: {str(e)}")
             return None
     
-    def check_streamlit_status(self, proc: subprocess.Popen, port: int, deployment_id: str):
-        """Check if Streamlit started successfully."""
-        if proc.poll() is not None:
-            # Process has already exited
-            stdout, stderr = proc.communicate()
-            logger.error(f"Streamlit failed to start on port {port}. Error: {stderr.decode()}")
-            
+    def wait_for_streamlit(self, proc: subprocess.Popen, port: int, timeout: float = STARTUP_TIMEOUT) -> bool:
+        """Wait until proc reports that its server is up; False if the process exits first."""
+        # Streamlit prints this banner only after its own server has bound the port, so unlike a
+        # connect probe it can't be satisfied by some other process listening there
+        deadline = time.monotonic() + timeout
+        output = b""
+        with selectors.DefaultSelector() as selector:
+            selector.register(proc.stdout, selectors.EVENT_READ)
+            while READY_BANNER not in output:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(f"Streamlit did not start on port {port} within {timeout:.0f}s")
+                if not selector.select(timeout=remaining):
+                    continue
+                chunk = os.read(proc.stdout.fileno(), 4096)
+                if not chunk:
+                    # EOF - the process exited (e.g. the port was taken before it could bind)
+                    proc.wait()
+                    logger.warning(f"Streamlit exited on port {port}: {output.decode(errors='replace')}")
+                    return False
+                output += chunk
+        return proc.poll() is None
+    
+    def drain_output(self, proc: subprocess.Popen) -> Tuple[threading.Thread, deque]:
+        """Keep reading proc's output in the background so the app never blocks on a full pipe."""
+        tail = deque(maxlen=OUTPUT_TAIL_LINES)
+        
+        def pump():
+            with proc.stdout:
+                for line in iter(proc.stdout.readline, b''):
+                    tail.append(line.decode(errors='replace').rstrip())
+        
+        thread = threading.Thread(target=pump, daemon=True)
+        thread.start()
+        return thread, tail
+    
+    def reap(self, proc: subprocess.Popen):
+        """Kill proc if it is still running and collect its exit status."""
+        if proc.poll() is None:
+            proc.kill()
+        try:
+            proc.wait(timeout=OUTPUT_READ_TIMEOUT)
+        except subprocess.TimeoutExpired:
+            logger.warning(f"Streamlit process {proc.pid} did not exit after kill")
+    
+    def monitor_deployments(self):
+        """Periodically clean up deployments whose Streamlit process has exited."""
+        while not self.stop_event.wait(MONITOR_INTERVAL):
             with self.lock:
-                if deployment_id in active_deployments:
-                    self.cleanup_deployment(deployment_id)
+                snapshot = list(active_deployments.items())
             
-            raise HTTPException(
-                status_code=500,
-                detail=f"Streamlit failed to start: {stderr.decode()}"
-            )
+            for deployment_id, deployment in snapshot:
+                proc = deployment['streamlit_process']
+                if proc.poll() is None:
+                    continue
+                
+                with self.lock:
+                    # An /undeploy since the snapshot terminated it on purpose - not a crash
+                    still_active = deployment_id in active_deployments
+                if not still_active:
+                    continue
+                
+                # Let the drain thread pick up the last lines - outside the lock and bounded,
+                # since a grandchild that inherited the pipe can keep it open after the app exits
+                deployment['output_thread'].join(timeout=OUTPUT_READ_TIMEOUT)
+                output = "\n".join(deployment['output_tail'])
+                logger.error(
+                    f"Streamlit for deployment {deployment_id} on port {deployment['port']} exited "
+                    f"with code {proc.returncode}: {output}"
+                )
+                # cleanup_deployment takes the lock itself
+                self.cleanup_deployment(deployment_id)
+    
+    def stop_monitoring(self):
+        """Stop the monitor thread."""
+        self.stop_event.set()
+        self.monitor_thread.join(timeout=MONITOR_INTERVAL)
     
     def start_ngrok_tunnel(self, port: int, deployment_id: str) -> Optional[str]:
         """Start ngrok tunnel and return public URL."""
@@ -185,6 +281,7 @@ async def lifespan(app: FastAPI):
     
     # Clean up all active deployments on shutdown
     logger.info("Server shutting down - cleaning up deployments")
+    app.state.deployment_manager.stop_monitoring()
     for deployment_id in list(active_deployments.keys()):
         app.state.deployment_manager.cleanup_deployment(deployment_id)
 
@@ -195,21 +292,17 @@ async def deploy_streamlit(file: UploadFile):
     """Endpoint to deploy a zipped Streamlit project."""
     deployment_id = str(uuid.uuid4())
     deployment_manager: DeploymentManager = app.state.deployment_manager
+    temp_dir = None
+    streamlit_proc = None
     
     try:
         # Create temp directory for this deployment
         temp_dir = tempfile.mkdtemp(prefix=f"streamlit_deploy_{deployment_id}_")
         logger.info(f"Created temp directory: {temp_dir}")
         
-        # Save uploaded zip file
-        zip_path = os.path.join(temp_dir, "uploaded.zip")
-        with open(zip_path, "wb") as f:
-            shutil.copyfileobj(file.file, f)
-        
-        # Unzip the file
-        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+        # Unzip straight from the upload's spooled file - no uploaded.zip copy on disk
+        with zipfile.ZipFile(file.file, 'r') as zip_ref:
             zip_ref.extractall(temp_dir)
-        os.remove(zip_path)
         logger.info(f"Unzipped project to {temp_dir}")
         
         # Install dependencies
@@ -219,14 +312,34 @@ async def deploy_streamlit(file: UploadFile):
                 detail="Failed to install dependencies from requirements.txt"
             )
         
-        # Find free port and start Streamlit
-        port = deployment_manager.find_free_port()
-        streamlit_proc = deployment_manager.run_streamlit_app(temp_dir, port, deployment_id)
+        # Find free port and start Streamlit. The port is only reserved until find_free_port
+        # returns, so another process can grab it before Streamlit binds - retry on a new one
+        for attempt in range(1, PORT_ATTEMPTS + 1):
+            port = deployment_manager.find_free_port()
+            proc = deployment_manager.run_streamlit_app(temp_dir, port, deployment_id)
+            if not proc:
+                raise HTTPException(
+                    status_code=400,
+                    detail="Failed to start Streamlit app - no valid Python file found"
+                )
+            try:
+                started = await asyncio.to_thread(deployment_manager.wait_for_streamlit, proc, port)
+            except BaseException:
+                # Timeout, a read error or cancellation - never leave the process behind
+                deployment_manager.reap(proc)
+                raise
+            if started:
+                streamlit_proc = proc
+                break
+            deployment_manager.reap(proc)
+            logger.warning(f"Streamlit failed to start on port {port} (attempt {attempt}/{PORT_ATTEMPTS})")
+        
         if not streamlit_proc:
             raise HTTPException(
-                status_code=400,
-                detail="Failed to start Streamlit app - no valid Python file found"
+                status_code=500,
+                detail="Streamlit failed to start"
             )
+        output_thread, output_tail = deployment_manager.drain_output(streamlit_proc)
         
         # Start ngrok tunnel
         public_url = deployment_manager.start_ngrok_tunnel(port, deployment_id)
@@ -243,7 +356,9 @@ async def deploy_streamlit(file: UploadFile):
                 'port': port,
                 'streamlit_process': streamlit_proc,
                 'ngrok_public_url': public_url,
-                'deployment_id': deployment_id
+                'deployment_id': deployment_id,
+                'output_thread': output_thread,
+                'output_tail': output_tail
             }
         
         return JSONResponse(
@@ -259,6 +374,12 @@ async def deploy_streamlit(file: UploadFile):
     except Exception as e:
         # Clean up if anything went wrong
         deployment_manager.cleanup_deployment(deployment_id)
+        # The deployment is only registered once its tunnel is up, so cleanup_deployment
+        # doesn't know about an earlier failure's process or temp directory
+        if streamlit_proc:
+            deployment_manager.reap(streamlit_proc)
+        if temp_dir:
+            shutil.rmtree(temp_dir, ignore_errors=True)
         logger.error(f"Deployment failed: {str(e)}")
         raise HTTPException(
             status_code=500,
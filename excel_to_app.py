@@ -1,14 +1,14 @@
 import streamlit as st
-import pandas as pd
-import time
-import uuid
 import os
 import tempfile
 import zipfile
 import shutil
-from pathlib import Path
 import logging
+import threading
 import requests
+from io import BytesIO
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 # Configure logging
 logging.basicConfig(
@@ -33,9 +33,19 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # Constants - Now configurable via environment variables
-MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB
+MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB - mirrors server.maxUploadSize in .streamlit/config.toml
+RAW_ZIP_SPOOL_SIZE = 16 * 1024 * 1024  # generated/project zips up to 16MB never touch disk
+PREVIEW_ROWS = 1000  # rows parsed for preview/validation; the full parse waits for Generate
 UNIFIED_API_URL = os.getenv("UNIFIED_API_URL", "http://127.0.0.1:8000/analyze-and-generate")
 DEPLOY_API_URL = os.getenv("DEPLOY_API_URL", "http://127.0.0.1:8001/deploy_streamlit")
+BACKEND_CONCURRENCY = int(os.getenv("BACKEND_CONCURRENCY", "4"))  # simultaneous generations per frontend process
+# (connect, read) timeouts in seconds - fail fast on an unreachable backend while still
+# allowing the slow LLM generation to finish
+CONNECT_TIMEOUT = float(os.getenv("CONNECT_TIMEOUT", "5"))
+UNIFIED_TIMEOUT = float(os.getenv("UNIFIED_TIMEOUT", "300"))
+# Deploys can run a full pip install before Streamlit starts - a timeout here doesn't stop the
+# server-side work, so keep the baseline budget rather than orphan a half-finished deployment
+DEPLOY_TIMEOUT = float(os.getenv("DEPLOY_TIMEOUT", "300"))
 PROMPT_FILE = os.getenv("PROMPT_FILE", "project_prompt.txt")
 INSTRUCTIONS_FILE = os.getenv("INSTRUCTIONS_FILE", "instructions.md")
 DEFAULT_ANALYSIS_MODEL = "deepseek/deepseek-chat-v3-0324:free"
@@ -49,17 +59,23 @@ if 'app_url' not in st.session_state:
 if 'uploaded_data' not in st.session_state:
     st.session_state.uploaded_data = None
 
+@st.cache_data(show_spinner=False)
+def read_config_file(path: str, mtime: float) -> str:
+    """Read a prompt/instructions file, cached until its mtime changes (st.cache_data survives script reruns)"""
+    with open(path, 'r') as f:
+        return f.read().strip()
+
 def get_project_prompt():
     """Read project prompt from file with error handling"""
     try:
-        if not os.path.exists(PROMPT_FILE):
-            raise FileNotFoundError(f"Prompt file not found at {PROMPT_FILE}")
-            
-        with open(PROMPT_FILE, 'r') as f:
-            prompt = f.read().strip()
-            if not prompt:
-                raise ValueError("Prompt file is empty")
-            return prompt
+        prompt = read_config_file(PROMPT_FILE, os.path.getmtime(PROMPT_FILE))
+        if not prompt:
+            raise ValueError("Prompt file is empty")
+        return prompt
+    except FileNotFoundError:
+        logger.error(f"Prompt file not found at {PROMPT_FILE}")
+        st.error(f"❌ System configuration error: Prompt file not found at {PROMPT_FILE}")
+        st.stop()
     except Exception as e:
         logger.error(f"Prompt file error: {str(e)}")
         st.error(f"❌ System configuration error: {str(e)}")
@@ -68,37 +84,76 @@ def get_project_prompt():
 def get_instructions():
     """Read analysis instructions from file with error handling"""
     try:
-        if not os.path.exists(INSTRUCTIONS_FILE):
-            logger.warning(f"Instructions file not found at {INSTRUCTIONS_FILE}")
-            return "Analyze the Excel file and generate a Python project based on the data."
-            
-        with open(INSTRUCTIONS_FILE, 'r') as f:
-            return f.read().strip()
+        return read_config_file(INSTRUCTIONS_FILE, os.path.getmtime(INSTRUCTIONS_FILE))
+    except FileNotFoundError:
+        logger.warning(f"Instructions file not found at {INSTRUCTIONS_FILE}")
+        return "Analyze the Excel file and generate a Python project based on the data."
     except Exception as e:
         logger.error(f"Instructions file error: {str(e)}")
         return "Analyze the Excel file and generate a Python project based on the data."
 
+@st.cache_data(max_entries=8, ttl=3600, show_spinner=False)
+def parse_upload(data: bytes, name: str, nrows: int = None):
+    """Parse uploaded CSV/Excel bytes (optionally only the first nrows rows) into a DataFrame.
+    
+    Cached on the file content, so Streamlit reruns (every widget click) don't re-parse.
+    """
+    # Imported on first upload rather than at startup so the page renders without waiting on pandas
+    import pandas as pd
+    
+    if name.endswith('.csv'):
+        return pd.read_csv(BytesIO(data), nrows=nrows)
+    
+    try:
+        # calamine (Rust) parses xlsx/xls far faster and leaner than openpyxl's XML DOM
+        return pd.read_excel(BytesIO(data), engine="calamine", nrows=nrows)
+    except Exception as e:
+        # Missing python-calamine, pandas < 2.2, or a workbook calamine can't handle (e.g. some .xlsm)
+        logger.info(f"calamine engine unavailable for {name}, using default: {str(e)}")
+        return pd.read_excel(BytesIO(data), nrows=nrows)
+
 def validate_excel_file(df):
     """Validate uploaded Excel file and return errors if any"""
+    import numpy as np
+    
     errors = []
     
-    if df.empty:
+    # Shape checks first - they don't touch the data
+    nrows, ncols = df.shape
+    if nrows == 0 or ncols == 0:
         errors.append("File is empty. Please upload a file with data.")
         return errors
     
-    if len(df.columns) < 2:
+    if ncols < 2:
         errors.append("File needs at least 2 columns to create a meaningful app.")
     
-    if len(df) < 5:
+    if nrows < 5:
         errors.append("File needs at least 5 rows of data for a useful app.")
     
-    # Check for completely empty columns
-    empty_cols = df.columns[df.isnull().all()].tolist()
+    # Check for completely empty columns with one reduction over the null mask array
+    empty_cols = df.columns[np.flatnonzero(df.isna().to_numpy().all(axis=0))].tolist()
     if empty_cols:
         errors.append(f"These columns are completely empty: {', '.join(empty_cols)}")
     
     return errors
 
+@st.cache_resource
+def get_http_session() -> requests.Session:
+    """Shared keep-alive session for the backend APIs (one pool per process, not per rerun)"""
+    session = requests.Session()
+    # Only connection failures are retried - a POST that reached the server may have
+    # already run the (slow, non-idempotent) generation or deployment
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8,
+                          max_retries=Retry(total=2, connect=2, read=0, status=0, backoff_factor=0.2))
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+@st.cache_resource
+def get_generation_slots() -> threading.BoundedSemaphore:
+    """Process-wide cap on concurrent generate calls, shared by all user sessions"""
+    return threading.BoundedSemaphore(BACKEND_CONCURRENCY)
+
 def update_progress_bar(progress_bar, status_container, progress, message, emoji):
     """Update progress bar and status message"""
     status_container.markdown(f'''
@@ -109,20 +164,42 @@ def update_progress_bar(progress_bar, status_container, progress, message, emoji
     ''', unsafe_allow_html=True)
     progress_bar.progress(progress)
 
-def process_excel_to_deployment(uploaded_excel_path: str) -> str:
-    """Orchestrate the full pipeline with proper file handling"""
+def process_excel_to_deployment(excel_data, filename: str = None, progress_cb=None) -> str:
+    """Orchestrate the full pipeline with proper file handling
+    
+    excel_data is the workbook content as bytes (or a binary file object) and is sent
+    as-is; a path string is still accepted and read from disk. progress_cb, if given, is
+    called as progress_cb(percent, message, emoji) when each pipeline stage starts.
+    """
+    def report(progress, message, emoji):
+        if progress_cb:
+            progress_cb(progress, message, emoji)
+    
+    if isinstance(excel_data, (str, os.PathLike)):
+        filename = filename or os.path.basename(excel_data)
+        with open(excel_data, 'rb') as f:
+            excel_data = f.read()
+    
     # Initialize variables to avoid reference before assignment
-    raw_zip_path = None
+    raw_zip = None
     project_zip = None
+    response = None
+    session = get_http_session()
     
     try:
         # Step 1: Call unified_api
-        with open(uploaded_excel_path, 'rb') as excel_file:
-            instructions = get_instructions()
-            response = requests.post(
+        instructions = get_instructions()
+        slots = get_generation_slots()
+        if not slots.acquire(blocking=False):
+            # Queue here rather than piling more requests onto the rate-limited LLM backend
+            report(15, "Waiting for a free generation slot...", "⏳")
+            slots.acquire()
+        try:
+            report(20, "Analyzing data structure and generating project code...", "🔍")
+            response = session.post(
                 UNIFIED_API_URL,
                 files={
-                    "excel_file": (os.path.basename(uploaded_excel_path), excel_file),
+                    "excel_file": (filename or "uploaded.xlsx", excel_data),
                     "analysis_instructions": ("instructions.md", instructions)
                 },
                 data={
@@ -130,8 +207,11 @@ def process_excel_to_deployment(uploaded_excel_path: str) -> str:
                     "analysis_model": DEFAULT_ANALYSIS_MODEL,
                     "generation_model": DEFAULT_GENERATION_MODEL
                 },
-                timeout=300
+                timeout=(CONNECT_TIMEOUT, UNIFIED_TIMEOUT),
+                stream=True
             )
+        finally:
+            slots.release()
         
         # Handle HTTP errors
         if response.status_code == 502:
@@ -143,22 +223,25 @@ def process_excel_to_deployment(uploaded_excel_path: str) -> str:
             raise RuntimeError(f"Processing error: {error_detail}")
         response.raise_for_status()
 
-        # Save the raw zip
-        raw_zip_path = os.path.join(tempfile.gettempdir(), f"raw_{uuid.uuid4().hex[:8]}.zip")
-        with open(raw_zip_path, 'wb') as f:
-            f.write(response.content)
+        # Stream the raw zip into a spooled buffer - stays in RAM unless it's unusually large
+        report(60, "Downloading generated project...", "👨‍💻")
+        raw_zip = tempfile.SpooledTemporaryFile(max_size=RAW_ZIP_SPOOL_SIZE)
+        with response:
+            for chunk in response.iter_content(chunk_size=1 << 20):
+                raw_zip.write(chunk)
+        raw_zip.seek(0)
 
         # Step 2: Extract only project files
-        project_zip = extract_project_files(raw_zip_path)
+        project_zip = extract_project_files(raw_zip)
         
         # Step 3: Call deploy API
-        with open(project_zip, 'rb') as project_file:
-            deploy_response = requests.post(
-                DEPLOY_API_URL,
-                files={"file": ("project.zip", project_file)},
-                timeout=300
-            )
-            
+        report(80, "Deploying your app...", "🚀")
+        deploy_response = session.post(
+            DEPLOY_API_URL,
+            files={"file": ("project.zip", project_zip)},
+            timeout=(CONNECT_TIMEOUT, DEPLOY_TIMEOUT)
+        )
+        
         if deploy_response.status_code == 502:
             raise RuntimeError("Deployment service is currently unavailable. Please try again later.")
         deploy_response.raise_for_status()
@@ -174,57 +257,44 @@ def process_excel_to_deployment(uploaded_excel_path: str) -> str:
         logger.error(f"Processing error: {str(e)}")
         raise RuntimeError(f"Failed to create app: {str(e)}")
     finally:
-        # Cleanup temporary files
-        for path in [raw_zip_path, project_zip]:
-            try:
-                if path and os.path.exists(path):
-                    os.unlink(path)
-            except Exception as e:
-                logger.warning(f"Failed to clean up temp file {path}: {str(e)}")
+        if response is not None:
+            response.close()
+        # Spooled buffers - closing releases the memory (or the spilled temp file)
+        for spool in (raw_zip, project_zip):
+            if spool is not None:
+                spool.close()
 
-def extract_project_files(zip_path: str) -> str:
-    """Extract only the generated project files from the zip"""
-    project_dir = os.path.join(tempfile.gettempdir(), f"project_{uuid.uuid4().hex[:8]}")
-    os.makedirs(project_dir, exist_ok=True)
+def extract_project_files(zip_src) -> tempfile.SpooledTemporaryFile:
+    """Repackage only the generated project files from the zip (path or file object), moved to its root
+    
+    Returns the new zip as a spooled file rewound to the start; the caller closes it.
+    """
+    project_zip = tempfile.SpooledTemporaryFile(max_size=RAW_ZIP_SPOOL_SIZE)
+    has_python = False
     
     try:
-        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-            # Extract only files from the 'generated/' directory
-            for file in zip_ref.namelist():
-                if file.startswith('generated/'):
-                    zip_ref.extract(file, project_dir)
-        
-        # Move files from generated/ to root
-        generated_dir = os.path.join(project_dir, 'generated')
-        if os.path.exists(generated_dir):
-            for item in os.listdir(generated_dir):
-                shutil.move(os.path.join(generated_dir, item), project_dir)
-            os.rmdir(generated_dir)
+        # Copy members zip-to-zip in one pass - no extract/move/walk through a temp directory
+        # Level-1 deflate: text sources shrink several-fold for the deploy upload at near-copy speed
+        with zipfile.ZipFile(zip_src, 'r') as zin, \
+                zipfile.ZipFile(project_zip, 'w', zipfile.ZIP_DEFLATED, compresslevel=1) as zout:
+            for info in zin.infolist():
+                if not info.filename.startswith('generated/') or info.is_dir():
+                    continue
+                arcname = info.filename[len('generated/'):]
+                has_python = has_python or ('/' not in arcname and arcname.endswith('.py'))
+                with zin.open(info) as src, zout.open(arcname, 'w') as dst:
+                    shutil.copyfileobj(src, dst, 1 << 20)
         
         # Verify we have at least one Python file
-        if not any(f.endswith('.py') for f in os.listdir(project_dir)):
+        if not has_python:
             raise ValueError("No Python files found in generated project")
         
-        # Create new clean zip
-        project_zip = os.path.join(tempfile.gettempdir(), f"project_{uuid.uuid4().hex[:8]}.zip")
-        with zipfile.ZipFile(project_zip, 'w') as zipf:
-            for root, _, files in os.walk(project_dir):
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    arcname = os.path.relpath(file_path, project_dir)
-                    zipf.write(file_path, arcname)
-        
+        project_zip.seek(0)
         return project_zip
     except Exception as e:
         logger.error(f"Failed to extract project files: {str(e)}")
+        project_zip.close()
         raise RuntimeError("Failed to process generated project files")
-    finally:
-        # Cleanup project directory
-        try:
-            if os.path.exists(project_dir):
-                shutil.rmtree(project_dir)
-        except Exception as e:
-            logger.warning(f"Failed to clean up project directory {project_dir}: {str(e)}")
 
 def main():
     """Main app interface"""
@@ -249,23 +319,25 @@ def main():
         
         if uploaded_file is not None:
             try:
-                # Validate size
+                # Validate size (Streamlit already rejects larger uploads; kept in case the config is overridden)
                 if uploaded_file.size > MAX_FILE_SIZE:
                     st.markdown('<div class="error-container">', unsafe_allow_html=True)
                     st.error("❌ File too large (max 10MB)")
                     st.markdown('</div>', unsafe_allow_html=True)
                     st.stop()
 
-                # Read the file
-                if uploaded_file.name.endswith('.csv'):
-                    df = pd.read_csv(uploaded_file)
-                else:
-                    df = pd.read_excel(uploaded_file)
-                
-                st.session_state.uploaded_data = df
+                # Read only the head of the file for preview and validation
+                file_bytes = uploaded_file.getvalue()
+                # One extra row tells a file of exactly PREVIEW_ROWS rows apart from a longer one
+                df = parse_upload(file_bytes, uploaded_file.name, PREVIEW_ROWS + 1)
+                truncated = len(df) > PREVIEW_ROWS
+                df = df.head(PREVIEW_ROWS)
                 
                 # Validate file
                 errors = validate_excel_file(df)
+                if errors and truncated:
+                    # A column empty in the head may have data further down - confirm on the full file
+                    errors = validate_excel_file(parse_upload(file_bytes, uploaded_file.name))
                 
                 if errors:
                     st.markdown('<div class="error-container">', unsafe_allow_html=True)
@@ -284,14 +356,16 @@ def main():
                     st.dataframe(df.head(), use_container_width=True)
                     st.markdown('</div>', unsafe_allow_html=True)
                     
-                    # Show data info
+                    # Show data info (counts are lower bounds when only the head was parsed)
+                    more = "+" if truncated else ""
+                    nrows, ncols = df.shape
                     col1, col2, col3 = st.columns(3)
                     with col1:
-                        st.metric("Rows", len(df))
+                        st.metric("Rows", f"{nrows:,}{more}")
                     with col2:
-                        st.metric("Columns", len(df.columns))
+                        st.metric("Columns", ncols)
                     with col3:
-                        st.metric("Data Points", len(df) * len(df.columns))
+                        st.metric("Data Points", f"{nrows * ncols:,}{more}")
                     
                     # Generate app button
                     st.markdown("### 🎯 Generate Your App")
@@ -305,32 +379,32 @@ def main():
                             status_container = st.empty()
                             
                             try:
-                                # Create temp file
-                                with tempfile.NamedTemporaryFile(suffix=".xlsx", delete=False) as tmp:
-                                    df.to_excel(tmp.name, index=False)
-                                    tmp_path = tmp.name
+                                # Build the upload in memory - no temp file round-trip
+                                if uploaded_file.name.endswith('.xlsx'):
+                                    # Send the original workbook: keeps formulas for the
+                                    # analyzer and skips a full DataFrame -> xlsx re-encode
+                                    excel_bytes = file_bytes
+                                else:
+                                    # CSV / legacy .xls are converted - the API parses .xlsx
+                                    buffer = BytesIO()
+                                    parse_upload(file_bytes, uploaded_file.name).to_excel(buffer, index=False)
+                                    excel_bytes = buffer.getvalue()
+                                excel_name = f"{os.path.splitext(uploaded_file.name)[0]}.xlsx"
                                 
-                                # Show processing steps with actual progress
+                                # Progress is driven by the pipeline's real stage transitions
                                 update_progress_bar(progress_bar, status_container, 10, "Uploading and validating file...", "📤")
-                                time.sleep(1)
                                 
-                                update_progress_bar(progress_bar, status_container, 30, "Analyzing data structure...", "🔍")
-                                time.sleep(1)
-                                
-                                update_progress_bar(progress_bar, status_container, 50, "Generating project code...", "👨‍💻")
+                                def on_progress(progress, message, emoji):
+                                    update_progress_bar(progress_bar, status_container, progress, message, emoji)
                                 
                                 # Process through pipeline
-                                st.session_state.app_url = process_excel_to_deployment(tmp_path)
+                                st.session_state.app_url = process_excel_to_deployment(excel_bytes, excel_name, on_progress)
                                 st.session_state.app_generated = True
+                                # Only a preview is needed once the app exists - don't keep the
+                                # full frame alive in session state for the rest of the session
+                                st.session_state.uploaded_data = df.head(20)
                                 
                                 update_progress_bar(progress_bar, status_container, 100, "App deployed successfully!", "🎉")
-                                time.sleep(1)
-                                
-                                # Cleanup
-                                try:
-                                    os.unlink(tmp_path)
-                                except Exception as e:
-                                    logger.warning(f"Failed to delete temp file {tmp_path}: {str(e)}")
                                 
                                 st.rerun()
                             
@@ -16,12 +16,18 @@ import io
 import asyncio
 import openpyxl
 from openpyxl import load_workbook
+from openpyxl.formula.translate import Translator
+import xml.etree.ElementTree as ET
 import xlrd
 import oletools.olevba as olevba
-import requests
+import httpx
 import json
 from datetime import datetime
+from contextlib import asynccontextmanager
 import traceback
+from itertools import islice
+import hashlib
+from collections import OrderedDict
 
 # Configure logging
 logging.basicConfig(
@@ -32,7 +38,18 @@ logger = logging.getLogger(__name__)
 
 load_dotenv()
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Share one pooled HTTP client across all LLM calls"""
+    app.state.http_client = httpx.AsyncClient(
+        timeout=LLM_TIMEOUT,
+        limits=httpx.Limits(max_keepalive_connections=10)
+    )
+    yield
+    await app.state.http_client.aclose()
+
 app = FastAPI(
+    lifespan=lifespan,
     title="Excel-to-Project Generator API",
     description="Analyzes Excel files and generates Python projects based on the analysis",
     version="3.1.0",
@@ -46,8 +63,66 @@ if not OPENROUTER_API_KEY:
     raise ValueError("Missing OPENROUTER_API_KEY")
 
 OPENROUTER_API_URL = "https://openrouter.ai/api/v1/chat/completions"
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "300"))  # seconds per LLM call
+LLM_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", "64"))  # 0 disables the response cache
 MAX_EXCEL_SIZE = 10 * 1024 * 1024  # 10MB
 MAX_PROJECT_SIZE = 5 * 1024 * 1024  # 5MB
+XLSX_SUFFIXES = frozenset({'.xlsx', '.xlsm'})
+ZIP_SPOOL_SIZE = 1024 * 1024  # output archives up to 1MB stay in memory
+ZIP_STREAM_CHUNK = 64 * 1024
+ZIP_STORE_BELOW = 4 * 1024  # deflate is a net loss on entries smaller than this
+CELL_REF_ROW_PATTERN = re.compile(r'[A-Z]+(\d+)')
+
+# OOXML namespaces used when streaming worksheet XML
+SHEET_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+DOC_REL_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+PKG_REL_NS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+# Static prompt sections, built once at import rather than on every request
+ANALYSIS_GUIDANCE = """**ANALYSIS GUIDANCE:**
+1. Identify key data structures and business logic
+2. Note calculations that should become API endpoints
+3. Flag potential security issues in VBA
+4. Suggest database models based on data
+5. Highlight any data validation rules
+"""
+
+GENERATION_FORMAT_INSTRUCTIONS = """**YOU MUST FOLLOW THESE EXACT INSTRUCTIONS:**
+
+1. Generate ALL required project files using THIS EXACT FORMAT for EACH file:
+
+FILENAME: relative/path/to/file.ext
+CONTENT:
+[EXACT FILE CONTENT STARTS HERE]
+... file content ...
+[EXACT FILE CONTENT ENDS HERE]
+====
+
+2. Requirements:
+- First file MUST be main.py or app.py
+- Include ALL necessary files (Python, configs, etc.)
+- Use PROPER SYNTAX for each file type
+- MAINTAIN EXACT INDENTATION
+- Include ALL imports and dependencies
+- Preserve Excel business logic
+
+3. Example VALID response:
+FILENAME: main.py
+CONTENT:
+from fastapi import FastAPI
+
+app = FastAPI()
+
+@app.get("/")
+def read_root():
+    return {"message": "Hello World"}
+====
+FILENAME: requirements.txt
+CONTENT:
+fastapi>=0.68.0
+uvicorn>=0.15.0
+====
+"""
 
 # --- Helper Functions ---
 def get_openai_client():
@@ -65,10 +140,10 @@ def _get_column_letter(col_idx: int) -> str:
         col_idx = col_idx // 26 - 1
     return string
 
-def extract_vba_code(file_path: Path) -> Optional[str]:
-    """Extract VBA code using oletools"""
+def extract_vba_code(file_path: Path, content: Optional[bytes] = None) -> Optional[str]:
+    """Extract VBA code using oletools (from content when given, else from disk)"""
     try:
-        vba_parser = olevba.VBA_Parser(str(file_path))
+        vba_parser = olevba.VBA_Parser(str(file_path), data=content)
         if not vba_parser.detect_vba_macros():
             return None
         
@@ -83,15 +158,85 @@ def extract_vba_code(file_path: Path) -> Optional[str]:
         logger.warning(f"VBA extraction failed: {str(e)}")
         return None
 
-def extract_formulas_xlsx(file_path: Path) -> Dict[str, Dict[str, str]]:
+def _xlsx_sheet_parts(zf: zipfile.ZipFile) -> List[Tuple[str, str]]:
+    """Map sheet names to their worksheet XML part inside the package"""
+    workbook = ET.fromstring(zf.read("xl/workbook.xml"))
+    rels = ET.fromstring(zf.read("xl/_rels/workbook.xml.rels"))
+    targets = {rel.get("Id"): rel.get("Target") for rel in rels.iter(f"{PKG_REL_NS}Relationship")}
+    
+    parts = []
+    for sheet in workbook.iter(f"{SHEET_NS}sheet"):
+        target = targets.get(sheet.get(f"{DOC_REL_NS}id"))
+        if not target or "worksheets/" not in target:
+            continue  # chartsheets and dialog sheets hold no cells
+        part = target.lstrip("/") if target.startswith("/") else f"xl/{target}"
+        parts.append((sheet.get("name"), part))
+    return parts
+
+def _stream_formulas_xml(zf: zipfile.ZipFile, sheet_part: str, sample_limit: Optional[int] = None) -> Dict[str, str]:
+    """Stream one worksheet XML part and collect its formulas without building cell objects"""
+    sheet_formulas = {}
+    row_num = 0
+    shared = {}  # si -> (origin coordinate, master formula)
+    cell_tag, formula_tag, row_tag = f"{SHEET_NS}c", f"{SHEET_NS}f", f"{SHEET_NS}row"
+    
+    with zf.open(sheet_part) as fh:
+        for event, elem in ET.iterparse(fh, events=("start", "end")):
+            if event == "start":
+                if elem.tag == row_tag:
+                    # Stop on the sheet row number (rows can be sparse), like openpyxl's max_row
+                    r = elem.get("r")
+                    row_num = int(r) if r else row_num + 1
+                    if sample_limit is not None and row_num > sample_limit:
+                        break
+                continue
+            if elem.tag == cell_tag:
+                f = elem.find(formula_tag)
+                if f is not None:
+                    coord = elem.get("r")
+                    if coord is None:
+                        raise ValueError(f"Cell without reference in {sheet_part}")
+                    text = f.text
+                    if f.get("t") == "shared":
+                        si = f.get("si")
+                        if text:
+                            shared[si] = (coord, text)
+                        elif si in shared:
+                            origin, master = shared[si]
+                            text = Translator(f"={master}", origin=origin).translate_formula(coord)
+                    if text:
+                        sheet_formulas[coord] = text if text.startswith('=') else f"={text}"
+                elem.clear()
+            elif elem.tag == row_tag:
+                elem.clear()
+    return sheet_formulas
+
+def extract_formulas_xlsx(file_path: Path, sample_limit: Optional[int] = None, content: Optional[bytes] = None) -> Dict[str, Dict[str, str]]:
     """Extract formulas from .xlsx files"""
+    try:
+        with zipfile.ZipFile(io.BytesIO(content) if content is not None else file_path) as zf:
+            parts = _xlsx_sheet_parts(zf)
+            if parts:
+                formulas = {}
+                for sheet_name, sheet_part in parts:
+                    sheet_formulas = _stream_formulas_xml(zf, sheet_part, sample_limit)
+                    if sheet_formulas:
+                        formulas[sheet_name] = sheet_formulas
+                return formulas
+    except Exception as e:
+        logger.warning(f"Streaming formula extraction failed, falling back to openpyxl: {str(e)}")
+    return _extract_formulas_openpyxl(file_path, sample_limit, content)
+
+def _extract_formulas_openpyxl(file_path: Path, sample_limit: Optional[int] = None, content: Optional[bytes] = None) -> Dict[str, Dict[str, str]]:
+    """Extract formulas from .xlsx files through openpyxl's read-only reader"""
     formulas = {}
     try:
-        wb = load_workbook(str(file_path), data_only=False, read_only=True)
+        source = io.BytesIO(content) if content is not None else str(file_path)
+        wb = load_workbook(source, data_only=False, read_only=True)
         for sheet_name in wb.sheetnames:
             ws = wb[sheet_name]
             sheet_formulas = {}
-            for row in ws.iter_rows():
+            for row in ws.iter_rows(max_row=sample_limit):
                 for cell in row:
                     if cell.data_type == 'f':
                         formula_value = str(cell.value)
@@ -105,15 +250,15 @@ def extract_formulas_xlsx(file_path: Path) -> Dict[str, Dict[str, str]]:
         logger.error(f"XLSX formula extraction failed: {str(e)}")
         return {}
 
-def extract_formulas_xls(file_path: Path) -> Dict[str, Dict[str, str]]:
+def extract_formulas_xls(file_path: Path, sample_limit: Optional[int] = None, content: Optional[bytes] = None) -> Dict[str, Dict[str, str]]:
     """Extract formulas from .xls files"""
     formulas = {}
     try:
-        workbook = xlrd.open_workbook(str(file_path), on_demand=True)
+        workbook = xlrd.open_workbook(str(file_path), on_demand=True, file_contents=content)
         for sheet_name in workbook.sheet_names():
             sheet = workbook.sheet_by_name(sheet_name)
             sheet_formulas = {}
-            for row_idx in range(sheet.nrows):
+            for row_idx in range(sheet.nrows if sample_limit is None else min(sheet.nrows, sample_limit)):
                 for col_idx in range(sheet.ncols):
                     cell = sheet.cell(row_idx, col_idx)
                     if cell.ctype == xlrd.XL_CELL_FORMULA:
@@ -127,13 +272,13 @@ def extract_formulas_xls(file_path: Path) -> Dict[str, Dict[str, str]]:
         logger.error(f"XLS formula extraction failed: {str(e)}")
         return {}
 
-def extract_formulas(file_path: Path) -> Dict[str, Dict[str, str]]:
-    """Extract formulas based on file type"""
+def extract_formulas(file_path: Path, sample_limit: Optional[int] = None, content: Optional[bytes] = None) -> Dict[str, Dict[str, str]]:
+    """Extract formulas based on file type, scanning at most sample_limit rows per sheet"""
     suffix = file_path.suffix.lower()
-    if suffix in ['.xlsx', '.xlsm']:
-        return extract_formulas_xlsx(file_path)
+    if suffix in XLSX_SUFFIXES:
+        return extract_formulas_xlsx(file_path, sample_limit, content)
     elif suffix == '.xls':
-        return extract_formulas_xls(file_path)
+        return extract_formulas_xls(file_path, sample_limit, content)
     return {}
 
 def get_formula_dependencies(formulas: Dict[str, Dict[str, str]]) -> Dict[str, Set[str]]:
@@ -149,8 +294,8 @@ def get_formula_dependencies(formulas: Dict[str, Dict[str, str]]) -> Dict[str, S
         deps[sheet] = sheet_deps
     return deps
 
-def select_rows(df: pd.DataFrame, formula_deps: Set[str]) -> pd.DataFrame:
-    """Smart row selection with formula-aware sampling"""
+def select_rows(df: pd.DataFrame, formula_rows: Set[int]) -> pd.DataFrame:
+    """Smart row selection with formula-aware sampling (formula_rows are 1-based sheet rows)"""
     if df.empty:
         return df
 
@@ -166,11 +311,10 @@ def select_rows(df: pd.DataFrame, formula_deps: Set[str]) -> pd.DataFrame:
     selected_indices.update(idx for idx in key_indices if 0 <= idx < num_rows)
 
     # Add formula dependencies
-    for dep in formula_deps:
-        if match := re.search(r'\d+', dep):
-            row_num = int(match.group(0)) - 1
-            if 0 <= row_num < num_rows:
-                selected_indices.add(row_num)
+    for row in formula_rows:
+        row_num = row - 1
+        if 0 <= row_num < num_rows:
+            selected_indices.add(row_num)
     
     # Fill with additional rows if needed
     for idx in df.index:
@@ -188,9 +332,10 @@ def generate_analysis_prompt(data: Dict[str, pd.DataFrame], formulas: Dict, vba:
         for sheet, df in data.items() if not df.empty
     ) or "\n\nNo data rows sampled or all sheets are empty."
 
+    # islice takes the first 100 formulas per sheet without listing every formula first
     formulas_str = "\n".join(
-        f"\n\n**Sheet: {sheet}**\n" + "\n".join(f"- {cell}: {formula}" for cell, formula in list(formulas.items())[:100])
-        for sheet, formulas in formulas.items() if formulas
+        f"\n\n**Sheet: {sheet}**\n" + "\n".join(f"- {cell}: {formula}" for cell, formula in islice(sheet_formulas.items(), 100))
+        for sheet, sheet_formulas in formulas.items() if sheet_formulas
     ) if formulas else "\n\nNo formulas detected."
 
     vba_section = f"\n\n**VBA CODE:**\n```vb\n{vba[:5000]}\n```" if vba else "\n\nNo VBA code detected."
@@ -204,13 +349,7 @@ def generate_analysis_prompt(data: Dict[str, pd.DataFrame], formulas: Dict, vba:
 
 **VBA CODE:**{vba_section}
 
-**ANALYSIS GUIDANCE:**
-1. Identify key data structures and business logic
-2. Note calculations that should become API endpoints
-3. Flag potential security issues in VBA
-4. Suggest database models based on data
-5. Highlight any data validation rules
-"""
+{ANALYSIS_GUIDANCE}"""
 
 def create_generation_prompt(analysis: str, project_prompt: str) -> str:
     """Generate project creation prompt with strict formatting"""
@@ -220,45 +359,33 @@ def create_generation_prompt(analysis: str, project_prompt: str) -> str:
 **ANALYSIS CONTEXT:**
 {analysis}
 
-**YOU MUST FOLLOW THESE EXACT INSTRUCTIONS:**
+{GENERATION_FORMAT_INSTRUCTIONS}"""
 
-1. Generate ALL required project files using THIS EXACT FORMAT for EACH file:
+# Recent LLM responses keyed by a digest of (model, temperature, prompt). The prompts
+# embed the sampled data, formulas, VBA and instructions, so identical uploads hit.
+_llm_cache: "OrderedDict[str, str]" = OrderedDict()
 
-FILENAME: relative/path/to/file.ext
-CONTENT:
-[EXACT FILE CONTENT STARTS HERE]
-... file content ...
-[EXACT FILE CONTENT ENDS HERE]
-====
+def _llm_cache_key(prompt: str, model: str, temperature: float) -> str:
+    """Content hash identifying an LLM request"""
+    digest = hashlib.blake2b(digest_size=16)
+    for part in (model, f"{temperature:.2f}", prompt):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
 
-2. Requirements:
-- First file MUST be main.py or app.py
-- Include ALL necessary files (Python, configs, etc.)
-- Use PROPER SYNTAX for each file type
-- MAINTAIN EXACT INDENTATION
-- Include ALL imports and dependencies
-- Preserve Excel business logic
-
-3. Example VALID response:
-FILENAME: main.py
-CONTENT:
-from fastapi import FastAPI
-
-app = FastAPI()
-
-@app.get("/")
-def read_root():
-    return {{"message": "Hello World"}}
-====
-FILENAME: requirements.txt
-CONTENT:
-fastapi>=0.68.0
-uvicorn>=0.15.0
-====
-"""
+def forget_llm_response(prompt: str, model: str, temperature: float = 0.3) -> None:
+    """Drop a cached response, e.g. one whose output turned out to be unusable"""
+    _llm_cache.pop(_llm_cache_key(prompt, model, max(0.1, min(temperature, 1.0))), None)
 
 async def call_llm(prompt: str, model: str, temperature: float = 0.3) -> str:
-    """Call LLM with error handling"""
+    """Call LLM with error handling, reusing cached responses for repeated prompts"""
+    temperature = max(0.1, min(temperature, 1.0))
+    cache_key = _llm_cache_key(prompt, model, temperature)
+    if cache_key in _llm_cache:
+        _llm_cache.move_to_end(cache_key)
+        logger.info(f"LLM cache hit for {model}")
+        return _llm_cache[cache_key]
+    
     headers = {
         "Authorization": f"Bearer {OPENROUTER_API_KEY}",
         "Content-Type": "application/json"
@@ -266,16 +393,23 @@ async def call_llm(prompt: str, model: str, temperature: float = 0.3) -> str:
     payload = {
         "model": model,
         "messages": [{"role": "user", "content": prompt}],
-        "temperature": max(0.1, min(temperature, 1.0))
+        "temperature": temperature
     }
     
     try:
-        response = requests.post(OPENROUTER_API_URL, headers=headers, json=payload)
+        client: httpx.AsyncClient = app.state.http_client
+        response = await client.post(OPENROUTER_API_URL, headers=headers, json=payload)
         response.raise_for_status()
-        return response.json()["choices"][0]["message"]["content"]
+        content = response.json()["choices"][0]["message"]["content"]
     except Exception as e:
         logger.error(f"API call failed: {str(e)}")
         raise HTTPException(502, f"AI service error: {str(e)}")
+    
+    if LLM_CACHE_SIZE > 0:
+        _llm_cache[cache_key] = content
+        if len(_llm_cache) > LLM_CACHE_SIZE:
+            _llm_cache.popitem(last=False)
+    return content
 
 def parse_generated_files(llm_response: str) -> Dict[str, str]:
     """Parse LLM response into files with enhanced validation"""
@@ -322,12 +456,13 @@ def parse_generated_files(llm_response: str) -> Dict[str, str]:
     
     return files
 
-def validate_python_syntax(content: str) -> bool:
+def validate_python_syntax(content: str, filename: str = "<string>") -> bool:
     """Basic Python syntax check"""
     try:
-        compile(content, "<string>", "exec")
+        # compile, not ast.parse: only the compiler rejects module-level return/await/yield
+        compile(content, filename, "exec")
         return True
-    except SyntaxError:
+    except (SyntaxError, ValueError):
         return False
 
 def validate_generated_files(files: Dict[str, str]) -> Tuple[bool, List[str]]:
@@ -346,37 +481,69 @@ def validate_generated_files(files: Dict[str, str]) -> Tuple[bool, List[str]]:
     # Validate Python syntax
     for filename, content in files.items():
         if filename.endswith('.py'):
-            if not validate_python_syntax(content):
+            if not validate_python_syntax(content, filename):
                 errors.append(f"Invalid Python syntax in {filename}")
     
     return (len(errors) == 0, errors)
 
-async def process_excel(file_path: Path) -> Dict[str, Any]:
-    """Process Excel file into structured data"""
+async def process_excel(file_path: Path, sample_limit: Optional[int] = None) -> Dict[str, Any]:
+    """Process Excel file into structured data, optionally capping rows read per sheet
+    
+    sample_limit counts worksheet rows, header row included, for the formula scan and the
+    sheet read alike.
+    """
     result = {
         "data": {},
-        "formulas": extract_formulas(file_path),
-        "vba": extract_vba_code(file_path),
+        "formulas": {},
+        "vba": None,
         "metadata": {}
     }
     
     try:
-        all_sheets = pd.read_excel(file_path, sheet_name=None, engine='openpyxl')
-        formula_deps = {
-            sheet: set(re.findall(r'[A-Z]+\d+', " ".join(formulas.values())))
+        # Read the workbook from disk once; each parser wraps the same bytes in its own
+        # BytesIO (no copy), so the concurrent readers never share a file position
+        content = await asyncio.to_thread(file_path.read_bytes)
+        
+        # Formula scan, VBA scan and sheet read are independent - run them side by side
+        # in worker threads so they overlap and don't block the event loop
+        result["formulas"], result["vba"], all_sheets = await asyncio.gather(
+            asyncio.to_thread(extract_formulas, file_path, sample_limit, content),
+            asyncio.to_thread(extract_vba_code, file_path, content),
+            # nrows counts data rows below the header, so one fewer than the sheet rows scanned
+            asyncio.to_thread(pd.read_excel, io.BytesIO(content), sheet_name=None, engine='openpyxl',
+                              nrows=None if sample_limit is None else sample_limit - 1)
+        )
+        # Only the referenced row numbers matter for sampling, so capture those
+        # directly instead of materializing every reference string
+        formula_rows = {
+            sheet: {int(row) for formula in formulas.values() for row in CELL_REF_ROW_PATTERN.findall(formula)}
             for sheet, formulas in result["formulas"].items()
         }
         
         for sheet, df in all_sheets.items():
-            result["data"][sheet] = select_rows(df, formula_deps.get(sheet, set()))
+            result["data"][sheet] = select_rows(df, formula_rows.get(sheet, set()))
         
         result["metadata"]["sheets"] = len(all_sheets)
         result["metadata"]["rows"] = sum(len(df) for df in result["data"].values())
+        result["metadata"]["sampled"] = sample_limit is not None
         return result
     except Exception as e:
         logger.error(f"Excel processing failed: {str(e)}")
         raise ValueError(f"Excel processing error: {str(e)}")
 
+def _zip_entry_compression(content: str) -> int:
+    """Store tiny entries as-is, deflate the rest"""
+    return zipfile.ZIP_STORED if len(content) < ZIP_STORE_BELOW else zipfile.ZIP_DEFLATED
+
+def _iter_spooled_file(spool, chunk_size: int = ZIP_STREAM_CHUNK):
+    """Yield a spooled file in chunks and release it once fully sent"""
+    try:
+        spool.seek(0)
+        while chunk := spool.read(chunk_size):
+            yield chunk
+    finally:
+        spool.close()
+
 async def generate_zip_output(analysis: str, generated_files: Dict[str, str], original_excel: Path) -> StreamingResponse:
     """Create final ZIP output with validation"""
     # Validate files before creating ZIP
@@ -385,33 +552,32 @@ async def generate_zip_output(analysis: str, generated_files: Dict[str, str], or
         logger.error(f"Invalid files generated: {', '.join(errors)}")
         raise HTTPException(422, detail=f"Invalid files generated: {', '.join(errors)}")
     
-    zip_buffer = io.BytesIO()
-    with zipfile.ZipFile(zip_buffer, 'w') as zipf:
-        zipf.writestr("analysis_report.md", analysis)
-        zipf.write(original_excel, f"original_{original_excel.name}")
+    # Small jobs stay in RAM, large ones spill to disk instead of holding a second full copy
+    zip_buffer = tempfile.SpooledTemporaryFile(max_size=ZIP_SPOOL_SIZE)
+    with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED, compresslevel=1) as zipf:
+        zipf.writestr("analysis_report.md", analysis, compress_type=_zip_entry_compression(analysis))
+        # .xlsx/.xlsm are already zip archives - deflating them again gains nothing
+        excel_compression = zipfile.ZIP_STORED if original_excel.suffix.lower() in XLSX_SUFFIXES else None
+        zipf.write(original_excel, f"original_{original_excel.name}", compress_type=excel_compression)
         
         for filename, content in generated_files.items():
-            zipf.writestr(f"generated/{filename}", content)
+            zipf.writestr(f"generated/{filename}", content, compress_type=_zip_entry_compression(content))
         
         # Add manifest with validation info
         manifest = {
             "generated_files": len(generated_files),
             "python_files": len([f for f in generated_files if f.endswith('.py')]),
             "validation": {
-                "python_syntax_valid": all(
-                    validate_python_syntax(c) 
-                    for f, c in generated_files.items() 
-                    if f.endswith('.py')
-                ),
+                # Reuse the validation pass instead of re-parsing every file
+                "python_syntax_valid": not any(e.startswith("Invalid Python syntax") for e in errors),
                 "errors": errors
             },
             "timestamp": datetime.now().isoformat()
         }
-        zipf.writestr("manifest.json", json.dumps(manifest, indent=2))
+        zipf.writestr("manifest.json", json.dumps(manifest, indent=2), compress_type=zipfile.ZIP_STORED)
     
-    zip_buffer.seek(0)
     return StreamingResponse(
-        zip_buffer,
+        _iter_spooled_file(zip_buffer),
         media_type="application/zip",
         headers={"Content-Disposition": f"attachment; filename=project_{uuid.uuid4().hex[:8]}.zip"}
     )
@@ -422,7 +588,8 @@ async def analyze_and_generate(
     analysis_instructions: UploadFile = File(...),
     project_prompt: str = Form(...),
     analysis_model: str = Form("deepseek/deepseek-chat-v3-0324:free"),
-    generation_model: str = Form("deepseek/deepseek-chat-v3-0324:free")
+    generation_model: str = Form("deepseek/deepseek-chat-v3-0324:free"),
+    sample_limit: Optional[int] = Form(None, ge=1)
 ):
     """
     Unified endpoint that:
@@ -434,6 +601,9 @@ async def analyze_and_generate(
     - Generated project files
     - Original Excel file
     - Manifest with metadata
+    
+    Set sample_limit to only scan the first N rows (header included) of each sheet, which keeps
+    large workbooks responsive in interactive use.
     """
     if excel_file.size > MAX_EXCEL_SIZE:
         raise HTTPException(413, "Excel file too large")
@@ -447,7 +617,7 @@ async def analyze_and_generate(
             with open(excel_path, "wb") as f:
                 shutil.copyfileobj(excel_file.file, f)
             
-            excel_data = await process_excel(excel_path)
+            excel_data = await process_excel(excel_path, sample_limit)
             instructions = (await analysis_instructions.read()).decode("utf-8")
             
             # Step 2: Generate Analysis
@@ -473,13 +643,19 @@ async def analyze_and_generate(
             if not generated_files:
                 # Log the full response if no files were generated
                 logger.error(f"No files generated. Full response:\n{generation_response}")
+                # Keep the (cached) analysis but let a retry sample a fresh generation
+                forget_llm_response(generation_prompt, generation_model, 0.3)
                 raise HTTPException(
                     422, 
                     detail="LLM failed to generate valid files. The response didn't match the expected format."
                 )
             
-            # Step 4: Create Output
-            return await generate_zip_output(analysis, generated_files, excel_path)
+            # Step 4: Create Output (validation runs first and exits before any archive work)
+            try:
+                return await generate_zip_output(analysis, generated_files, excel_path)
+            except HTTPException:
+                forget_llm_response(generation_prompt, generation_model, 0.3)
+                raise
             
         except HTTPException:
             raise